@@ -1,55 +1,114 @@
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, Response, request, jsonify, render_template_string
+from flask.json.provider import JSONProvider
 import time
 import hashlib
 import json
 import os
-from ecdsa import SigningKey, SECP256k1
+import queue
+import sys
+import itertools
+import struct
+import threading
+from collections import defaultdict, deque
+from coincurve import PrivateKey
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # ==================== CLASSES DU TP ====================
 
+# Format du nonce, seule partie variable de l'en-tête de bloc
+NONCE_FORMAT = struct.Struct('>Q')
+
 class Block:
+    __slots__ = ('index', 'transactions', 'previous_hash', 'timestamp', 'nonce',
+                 'merkle_root', 'hash', '_tx_bytes', '_leaf_hashes', '_merkle_cache')
+    
     def __init__(self, index, transactions, previous_hash, timestamp=None, nonce=0):
         self.index = index
+        # transactions sert à l'affichage/API ; _tx_bytes est leur encodage canonique, calculé une fois
         self.transactions = transactions
+        self._tx_bytes = tuple(_canonical_tx(tx) for tx in transactions)
         self.previous_hash = previous_hash
         self.timestamp = timestamp or time.time()
         self.nonce = nonce
-        self.merkle_root = self.compute_merkle_root(transactions)
+        # Feuilles et racine Merkle gardées en cache pour la validation
+        self._leaf_hashes = tuple(hashlib.sha256(data).digest() for data in self._tx_bytes)
+        self.merkle_root = self._merkle_cache = self.compute_merkle_root(self._leaf_hashes)
         self.hash = self.compute_hash()
     
-    def compute_hash(self):
-        block_data = {
+    def to_dict(self):
+        return {
             'index': self.index,
+            'timestamp': self.timestamp,
             'transactions': self.transactions,
+            'hash': self.hash,
             'previous_hash': self.previous_hash,
-            'timestamp': self.timestamp,
-            'nonce': self.nonce,
-            'merkle_root': self.merkle_root
+            'merkle_root': self.merkle_root,
+            'nonce': self.nonce
         }
-        return hashlib.sha256(json.dumps(block_data, sort_keys=True).encode()).hexdigest()
     
-    def compute_merkle_root(self, transactions):
-        if not transactions:
+    def hash_prefix(self):
+        # En-tête binaire fixe : seul le nonce, placé en dernier, varie.
+        # Les transactions sont engagées via la racine Merkle.
+        return (struct.pack('>Id', self.index, self.timestamp)
+                + _pack_str(self.previous_hash)
+                + _pack_str(self.merkle_root or '')
+                + struct.pack('>I', len(self.transactions)))
+    
+    def compute_hash(self):
+        data = self.hash_prefix() + NONCE_FORMAT.pack(self.nonce)
+        return hashlib.sha256(data).hexdigest()
+    
+    def compute_merkle_root(self, leaf_hashes):
+        if not leaf_hashes:
             return None
-        hashes = [hashlib.sha256(json.dumps(tx, sort_keys=True).encode()).hexdigest() 
-                  for tx in transactions]
+        # Digests bruts de 32 octets ; seule la racine est convertie en hexadécimal
+        hashes = list(leaf_hashes)
+        sha256 = hashlib.sha256
         while len(hashes) > 1:
-            temp = []
-            for i in range(0, len(hashes), 2):
-                if i+1 < len(hashes):
-                    combined = hashes[i] + hashes[i+1]
-                else:
-                    combined = hashes[i] + hashes[i]
-                temp.append(hashlib.sha256(combined.encode()).hexdigest())
-            hashes = temp
-        return hashes[0]
+            # Niveau impair : on duplique le dernier hash puis on hache les paires d'un coup.
+            # Pas de pool de threads : hashlib garde le GIL pour des entrées de 64 octets.
+            if len(hashes) % 2:
+                hashes.append(hashes[-1])
+            pairs = iter(hashes)
+            hashes = [sha256(left + right).digest() for left, right in zip(pairs, pairs)]
+        return hashes[0].hex()
+    
+    def verify_merkle_root(self):
+        # Ré-encodage depuis transactions pour détecter une modification
+        tx_bytes = tuple(_canonical_tx(tx) for tx in self.transactions)
+        if tx_bytes == self._tx_bytes:
+            # Transactions intactes : on compare à la racine calculée à la création, sans SHA
+            return self.merkle_root == self._merkle_cache
+        # Sinon seules les feuilles modifiées sont re-hachées avant de reconstruire l'arbre
+        leaves = [leaf if data == old else hashlib.sha256(data).digest()
+                  for data, old, leaf in zip(tx_bytes, self._tx_bytes, self._leaf_hashes)]
+        leaves += [hashlib.sha256(data).digest() for data in tx_bytes[len(leaves):]]
+        return self.merkle_root == self.compute_merkle_root(leaves)
 
 
 class Blockchain:
-    def __init__(self, difficulty=2):
+    def __init__(self, difficulty=2, max_mempool_size=1000, max_subscribers=8):
         self.chain = []
-        self.mempool = []
+        self.mempool = deque()
+        self.max_mempool_size = max_mempool_size
         self.difficulty = difficulty
+        # (soldes des blocs validés, dépenses en attente par adresse), remplacés ensemble
+        # en une seule affectation à chaque bloc : get_balance lit sans verrou
+        self._balances = (defaultdict(int), defaultdict(int))
+        # JSON de la chaîne, invalidé à chaque nouveau bloc
+        self._chain_cache = None
+        # Protège les modifications de la chaîne et de la mempool
+        self.lock = threading.RLock()
+        # Une file par client connecté à /events. Chaque client occupe un thread
+        # gunicorn tant qu'il est connecté : leur nombre est plafonné bien en dessous
+        # de `threads` (gunicorn_conf.py) pour laisser de quoi servir les autres requêtes.
+        self.subscribers = []
+        self.max_subscribers = max_subscribers
+        self._subscribers_lock = threading.Lock()
         self.create_genesis_block()
     
     def create_genesis_block(self):
@@ -62,70 +121,202 @@ class Blockchain:
         ]
         genesis_block = Block(0, initial_transactions, "0")
         self.chain.append(genesis_block)
+        self._balances = (self.apply_balance_deltas(self.balance_deltas(genesis_block.transactions)),
+                          defaultdict(int))
+    
+    @property
+    def balances(self):
+        return self._balances[0]
+    
+    @property
+    def mempool_deltas(self):
+        return self._balances[1]
+    
+    def balance_deltas(self, transactions):
+        deltas = defaultdict(int)
+        for tx in transactions:
+            amount = tx.get('amount', 0)
+            deltas[tx.get('sender')] -= amount
+            deltas[tx.get('recipient')] += amount
+        return deltas
+    
+    def apply_balance_deltas(self, deltas):
+        # Nouveau dict : l'ancien reste intact pour les lecteurs en cours
+        balances = self.balances.copy()
+        for address, delta in deltas.items():
+            balances[address] += delta
+        return balances
     
     def add_transaction(self, transaction):
-        self.mempool.append(transaction)
-        return True
+        with self.lock:
+            if len(self.mempool) >= self.max_mempool_size:
+                return False
+            self.mempool_deltas[transaction.get('sender')] -= transaction.get('amount', 0)
+            self.mempool.append(transaction)
+            self.notify(lambda: {
+                'type': 'transaction',
+                'transaction': transaction,
+                'pending': len(self.mempool)
+            })
+            return True
     
     def proof_of_work(self, block):
-        block.nonce = 0
-        computed_hash = block.compute_hash()
-        while not computed_hash.startswith('0' * self.difficulty):
-            block.nonce += 1
-            computed_hash = block.compute_hash()
+        block.nonce, computed_hash = find_nonce(block.hash_prefix(), self.difficulty)
         return computed_hash
     
     def mine_block(self, miner_address="miner1"):
-        if not self.mempool:
-            return None
-        
-        # Récompense de minage
-        reward_tx = create_transaction("network", miner_address, 10)
-        self.mempool.append(reward_tx)
-        
-        new_block = Block(len(self.chain), self.mempool, self.chain[-1].hash)
-        new_block.hash = self.proof_of_work(new_block)
-        
-        self.chain.append(new_block)
-        self.mempool = []
+        with self.lock:
+            if not self.mempool:
+                return None
+            
+            # Récompense de minage
+            reward_tx = create_transaction("network", miner_address, 10)
+            transactions = list(self.mempool) + [reward_tx]
+            
+            # Tout ce qui peut échouer est fait avant de toucher à la chaîne
+            new_block = Block(len(self.chain), transactions, self.chain[-1].hash)
+            new_block.hash = self.proof_of_work(new_block)
+            balances = self.apply_balance_deltas(self.balance_deltas(new_block.transactions))
+            
+            self.chain.append(new_block)
+            self._chain_cache = None
+            # Soldes validés et dépenses en attente changent ensemble : jamais de double débit
+            self._balances = (balances, defaultdict(int))
+            self.mempool.clear()
         
         print(f"✅ Bloc #{new_block.index} miné: {new_block.hash}")
+        self.notify(lambda: {
+            'type': 'block',
+            'block': new_block.to_dict(),
+            'length': len(self.chain),
+            'pending': len(self.mempool),
+            'valid': self.is_chain_valid()
+        })
         return new_block
     
+    def subscribe(self):
+        with self._subscribers_lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                return None
+            q = queue.Queue(maxsize=100)
+            self.subscribers.append(q)
+            return q
+    
+    def unsubscribe(self, q):
+        with self._subscribers_lock:
+            self.subscribers.remove(q)
+    
+    def notify(self, make_event):
+        # L'événement n'est construit (validation comprise) que si quelqu'un écoute,
+        # puis sérialisé une seule fois pour tous ; un client trop lent perd l'événement
+        if not self.subscribers:
+            return
+        data = _canonical_json(make_event()).decode()
+        for q in list(self.subscribers):
+            try:
+                q.put_nowait(data)
+            except queue.Full:
+                pass
+    
+    def chain_json(self):
+        # Renvoie (longueur, JSON) issus du même instantané de la chaîne.
+        # Lecture sans verrou tant que le cache est valide (pas d'attente pendant le minage)
+        cache = self._chain_cache
+        if cache is not None:
+            return cache
+        with self.lock:
+            if self._chain_cache is None:
+                blocks = [block.to_dict() for block in self.chain]
+                self._chain_cache = (len(blocks), _canonical_json(blocks))
+            return self._chain_cache
+    
     def is_chain_valid(self):
+        target = '0' * self.difficulty
+        
+        # Vérifications peu coûteuses d'abord (chaînage et difficulté), sans aucun SHA
         for i in range(1, len(self.chain)):
             curr = self.chain[i]
             prev = self.chain[i-1]
             
-            if curr.hash != curr.compute_hash():
-                print(f"Bloc {i} invalide : hash incorrect")
-                return False
-            
             if curr.previous_hash != prev.hash:
                 print(f"Bloc {i} invalide : previous_hash incorrect")
                 return False
             
-            if not curr.hash.startswith('0' * self.difficulty):
+            if not curr.hash.startswith(target):
                 print(f"Bloc {i} invalide : proof of work incorrecte")
                 return False
         
+        # Puis recalcul des racines Merkle et des hash
+        for i in range(1, len(self.chain)):
+            curr = self.chain[i]
+            if not curr.verify_merkle_root():
+                print(f"Bloc {i} invalide : racine Merkle incorrecte")
+                return False
+            
+            if curr.hash != curr.compute_hash():
+                print(f"Bloc {i} invalide : hash incorrect")
+                return False
+        
+        # Audit : les soldes tenus à jour bloc par bloc doivent correspondre à un recalcul complet
+        with self.lock:
+            if self.compute_balances() != self.balances:
+                print("Soldes incohérents avec la chaîne")
+                return False
+        
         return True
     
     def get_balance(self, address):
-        balance = 0
+        # Solde validé + dépenses en attente, lus dans le même instantané
+        balances, mempool_deltas = self._balances
+        return balances.get(address, 0) + mempool_deltas.get(address, 0)
+    
+    def compute_balances(self):
+        # Recalcul complet depuis la chaîne, pour l'audit de is_chain_valid.
+        # Mêmes additions, dans le même ordre, que la mise à jour incrémentale.
+        balances = defaultdict(int)
         for block in self.chain:
-            for tx in block.transactions:
-                if tx.get('sender') == address:
-                    balance -= tx.get('amount', 0)
-                if tx.get('recipient') == address:
-                    balance += tx.get('amount', 0)
-        
-        # Ajouter les transactions en attente
-        for tx in self.mempool:
-            if tx.get('sender') == address:
-                balance -= tx.get('amount', 0)
-        
-        return balance
+            for address, delta in self.balance_deltas(block.transactions).items():
+                balances[address] += delta
+        return balances
+
+
+def find_nonce(prefix, difficulty):
+    # Le préfixe est haché une seule fois, puis on ne rajoute que le nonce
+    # (hashlib s'appuie sur OpenSSL, qui utilise déjà SHA-NI si le CPU l'offre)
+    copy = hashlib.sha256(prefix).copy
+    pack_nonce = NONCE_FORMAT.pack
+    # Difficulté testée sur le digest brut : octets nuls, plus un demi-octet si impaire
+    zero_prefix = b'\x00' * (difficulty // 2)
+    nibble_index = len(zero_prefix)
+    for nonce in itertools.count():
+        h = copy()
+        h.update(pack_nonce(nonce))
+        digest = h.digest()
+        if digest.startswith(zero_prefix) and (difficulty % 2 == 0 or digest[nibble_index] < 0x10):
+            return nonce, digest.hex()
+
+
+def _pack_str(value):
+    # Chaînes uniquement : 123 et "123" ne doivent pas donner les mêmes octets
+    if not isinstance(value, str):
+        raise TypeError(f"chaîne attendue, reçu {type(value).__name__}")
+    data = value.encode()
+    return struct.pack('>I', len(data)) + data
+
+
+def _canonical_tx(tx):
+    # Encodage binaire compact pour les transactions standard, JSON trié sinon
+    if tx.keys() == {'sender', 'recipient', 'amount', 'timestamp'}:
+        return (_pack_str(tx['sender']) + _pack_str(tx['recipient'])
+                + struct.pack('>dd', tx['amount'], tx['timestamp']))
+    return _canonical_json(tx)
+
+
+def _canonical_json(obj):
+    # JSON compact à clés triées ; orjson si disponible, sinon json de la stdlib
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode()
 
 
 def create_transaction(sender, recipient, amount):
@@ -138,20 +329,18 @@ def create_transaction(sender, recipient, amount):
 
 
 def generate_keys():
-    priv = SigningKey.generate(curve=SECP256k1)
-    pub = priv.get_verifying_key()
+    priv = PrivateKey()
+    pub = priv.public_key
     return priv, pub
 
 
 def sign_transaction(transaction, priv_key):
-    tx_str = json.dumps(transaction, sort_keys=True)
-    return priv_key.sign(tx_str.encode()).hex()
+    return priv_key.sign(_canonical_tx(transaction)).hex()
 
 
 def verify_transaction(transaction, signature, pub_key):
-    tx_str = json.dumps(transaction, sort_keys=True)
     try:
-        return pub_key.verify(bytes.fromhex(signature), tx_str.encode())
+        return pub_key.verify(bytes.fromhex(signature), _canonical_tx(transaction))
     except:
         return False
 
@@ -489,7 +678,11 @@ HTML_TEMPLATE = '''
                     showMessage('txMessage', data.message, 'success');
                     e.target.reset();
                     document.getElementById('senderBalance').innerHTML = '';
-                    loadStats();
+                    // Sans SSE (mode de secours), on n'attend pas le prochain rechargement
+                    if (pollTimer) {
+                        loadBlockchain();
+                        loadStats();
+                    }
                 } else {
                     showMessage('txMessage', data.error || data.message, 'error');
                 }
@@ -514,8 +707,10 @@ HTML_TEMPLATE = '''
                 
                 if (response.ok) {
                     showMessage('mineMessage', data.message, 'success');
-                    loadBlockchain();
-                    loadStats();
+                    if (pollTimer) {
+                        loadBlockchain();
+                        loadStats();
+                    }
                 } else {
                     showMessage('mineMessage', data.message || data.error, 'error');
                 }
@@ -538,7 +733,7 @@ HTML_TEMPLATE = '''
                 const data = await response.json();
                 
                 showMessage('validateMessage', data.message, data.valid ? 'success' : 'error');
-                loadStats();
+                document.getElementById('chainValid').textContent = data.valid ? '✅ Valide' : '❌ Invalide';
                 
             } catch (error) {
                 showMessage('validateMessage', 'Erreur: ' + error.message, 'error');
@@ -557,57 +752,59 @@ HTML_TEMPLATE = '''
                 container.innerHTML = '';
                 
                 const blocks = [...data.chain].reverse();
-                blocks.forEach(block => {
-                    const blockDiv = document.createElement('div');
-                    blockDiv.className = 'block';
-                    
-                    const date = new Date(block.timestamp * 1000).toLocaleString('fr-FR');
-                    
-                    let txHTML = '';
-                    block.transactions.forEach(tx => {
-                        txHTML += `
-                            <div class="transaction">
-                                <div class="tx-info">
-                                    <span><strong>${tx.sender}</strong> → <strong>${tx.recipient}</strong></span>
-                                    <span style="color: #28a745; font-weight: bold;">${tx.amount} coins</span>
-                                </div>
-                            </div>
-                        `;
-                    });
-                    
-                    blockDiv.innerHTML = `
-                        <div class="block-header">
-                            <span class="block-index">Bloc #${block.index}</span>
-                            <span style="color: #999; font-size: 0.85em;">${date}</span>
-                        </div>
-                        <div style="margin-bottom: 10px;">
-                            <strong>Hash:</strong>
-                            <div class="hash-box">${block.hash}</div>
-                        </div>
-                        <div style="margin-bottom: 10px;">
-                            <strong>Hash Précédent:</strong>
-                            <div class="hash-box">${block.previous_hash}</div>
-                        </div>
-                        ${block.merkle_root ? `
-                        <div style="margin-bottom: 10px;">
-                            <strong>Racine Merkle:</strong>
-                            <div class="hash-box">${block.merkle_root}</div>
-                        </div>` : ''}
-                        <div style="margin-bottom: 15px;">
-                            <strong>Nonce:</strong> ${block.nonce}
-                        </div>
-                        <strong>Transactions (${block.transactions.length}):</strong>
-                        ${txHTML || '<p style="color: #999; margin-top: 10px;">Aucune transaction (Genesis Block)</p>'}
-                    `;
-                    
-                    container.appendChild(blockDiv);
-                });
+                blocks.forEach(block => container.appendChild(renderBlock(block)));
                 
             } catch (error) {
                 console.error('Erreur chargement blockchain:', error);
             }
         }
         
+        function renderBlock(block) {
+            const blockDiv = document.createElement('div');
+            blockDiv.className = 'block';
+            
+            const date = new Date(block.timestamp * 1000).toLocaleString('fr-FR');
+            
+            let txHTML = '';
+            block.transactions.forEach(tx => {
+                txHTML += `
+                    <div class="transaction">
+                        <div class="tx-info">
+                            <span><strong>${tx.sender}</strong> → <strong>${tx.recipient}</strong></span>
+                            <span style="color: #28a745; font-weight: bold;">${tx.amount} coins</span>
+                        </div>
+                    </div>
+                `;
+            });
+            
+            blockDiv.innerHTML = `
+                <div class="block-header">
+                    <span class="block-index">Bloc #${block.index}</span>
+                    <span style="color: #999; font-size: 0.85em;">${date}</span>
+                </div>
+                <div style="margin-bottom: 10px;">
+                    <strong>Hash:</strong>
+                    <div class="hash-box">${block.hash}</div>
+                </div>
+                <div style="margin-bottom: 10px;">
+                    <strong>Hash Précédent:</strong>
+                    <div class="hash-box">${block.previous_hash}</div>
+                </div>
+                ${block.merkle_root ? `
+                <div style="margin-bottom: 10px;">
+                    <strong>Racine Merkle:</strong>
+                    <div class="hash-box">${block.merkle_root}</div>
+                </div>` : ''}
+                <div style="margin-bottom: 15px;">
+                    <strong>Nonce:</strong> ${block.nonce}
+                </div>
+                <strong>Transactions (${block.transactions.length}):</strong>
+                ${txHTML || '<p style="color: #999; margin-top: 10px;">Aucune transaction (Genesis Block)</p>'}
+            `;
+            
+            return blockDiv;
+        }
+        
         async function loadStats() {
             try {
                 const chainResponse = await fetch('/chain');
@@ -637,10 +834,64 @@ HTML_TEMPLATE = '''
             }, 5000);
         }
         
-        setInterval(() => {
-            loadBlockchain();
-            loadStats();
-        }, 10000);
+        // Mises à jour poussées par le serveur (SSE) au lieu d'un rechargement périodique
+        let connected = false;
+        let pollTimer = null;
+        
+        function connectEvents() {
+            const events = new EventSource('/events');
+            
+            events.onerror = () => {
+                // Connexion refusée (ex. 503, trop de clients) : EventSource abandonne.
+                // On revient au rechargement périodique et on retente SSE un peu plus tard
+                if (events.readyState === EventSource.CLOSED) {
+                    if (!pollTimer) {
+                        pollTimer = setInterval(() => {
+                            loadBlockchain();
+                            loadStats();
+                        }, 10000);
+                    }
+                    setTimeout(connectEvents, 5000);
+                }
+            };
+            
+            events.onopen = () => {
+                if (pollTimer) {
+                    clearInterval(pollTimer);
+                    pollTimer = null;
+                }
+                // Après une reconnexion, des événements ont pu être manqués : on resynchronise
+                if (connected) {
+                    loadBlockchain();
+                    loadStats();
+                }
+                connected = true;
+            };
+            
+            events.onmessage = onEvent;
+        }
+        
+        function onEvent(e) {
+            const event = JSON.parse(e.data);
+            document.getElementById('pendingTx').textContent = event.pending;
+            
+            if (event.type === 'block') {
+                document.getElementById('blockchain').prepend(renderBlock(event.block));
+                document.getElementById('totalBlocks').textContent = event.length;
+                document.getElementById('chainValid').textContent = event.valid ? '✅ Valide' : '❌ Invalide';
+            }
+            
+            // Rafraîchir le solde affiché si la transaction concerne l'expéditeur saisi
+            const sender = document.getElementById('sender');
+            const touched = event.type === 'block'
+                ? event.block.transactions.some(tx => tx.sender === sender.value || tx.recipient === sender.value)
+                : event.transaction.sender === sender.value;
+            if (touched && sender.value.length > 2) {
+                sender.dispatchEvent(new Event('input'));
+            }
+        }
+        
+        connectEvents();
     </script>
 </body>
 </html>
@@ -648,10 +899,21 @@ HTML_TEMPLATE = '''
 
 # ==================== FLASK APP ====================
 
+class OrjsonProvider(JSONProvider):
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 # Créer l'instance blockchain globale
-blockchain = Blockchain(difficulty=3)
+blockchain = Blockchain(difficulty=3,
+                        max_subscribers=int(os.environ.get('MAX_EVENT_CLIENTS', 8)))
 
 app = Flask(__name__)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
 
 @app.route('/')
 def home():
@@ -673,16 +935,22 @@ def new_transaction():
     except ValueError:
         return jsonify({'error': 'Le montant doit être un nombre'}), 400
     
-    # Vérifier le solde (sauf pour "network")
-    if values['sender'] != 'network':
-        balance = blockchain.get_balance(values['sender'])
-        if balance < amount:
-            return jsonify({
-                'error': f'Solde insuffisant. Solde actuel: {balance} coins'
-            }), 400
+    if not isinstance(values['sender'], str) or not isinstance(values['recipient'], str):
+        return jsonify({'error': "L'expéditeur et le destinataire doivent être des chaînes"}), 400
     
-    tx = create_transaction(values['sender'], values['recipient'], amount)
-    blockchain.add_transaction(tx)
+    # Vérification du solde et ajout sous le même verrou (pas de double dépense entre threads)
+    with blockchain.lock:
+        # Vérifier le solde (sauf pour "network")
+        if values['sender'] != 'network':
+            balance = blockchain.get_balance(values['sender'])
+            if balance < amount:
+                return jsonify({
+                    'error': f'Solde insuffisant. Solde actuel: {balance} coins'
+                }), 400
+        
+        tx = create_transaction(values['sender'], values['recipient'], amount)
+        if not blockchain.add_transaction(tx):
+            return jsonify({'error': 'Mempool pleine, minez un bloc avant de continuer'}), 503
     
     return jsonify({
         'message': f'Transaction ajoutée au mempool !',
@@ -694,45 +962,51 @@ def new_transaction():
 def mine():
     miner_address = request.args.get('miner', 'miner1')
     
-    if not blockchain.mempool:
-        return jsonify({'message': 'Aucune transaction à miner !'}), 400
-    
     start_time = time.time()
     block = blockchain.mine_block(miner_address)
     mining_time = time.time() - start_time
     
+    if block is None:
+        return jsonify({'message': 'Aucune transaction à miner !'}), 400
+    
     return jsonify({
         'message': f'Bloc #{block.index} miné avec succès en {mining_time:.2f}s !',
-        'block': {
-            'index': block.index,
-            'timestamp': block.timestamp,
-            'transactions': block.transactions,
-            'hash': block.hash,
-            'previous_hash': block.previous_hash,
-            'merkle_root': block.merkle_root,
-            'nonce': block.nonce
-        },
+        'block': block.to_dict(),
         'mining_time': mining_time
     }), 200
 
 @app.route('/chain', methods=['GET'])
 def full_chain():
-    chain_data = [{
-        'index': block.index,
-        'timestamp': block.timestamp,
-        'transactions': block.transactions,
-        'hash': block.hash,
-        'previous_hash': block.previous_hash,
-        'merkle_root': block.merkle_root,
-        'nonce': block.nonce
-    } for block in blockchain.chain]
-    
-    return jsonify({
-        'length': len(chain_data),
-        'chain': chain_data,
-        'pending_transactions': blockchain.mempool,
+    # La chaîne sérialisée vient du cache ; seule la partie variable est encodée ici
+    length, chain_bytes = blockchain.chain_json()
+    data = _canonical_json({
+        'length': length,
+        'pending_transactions': list(blockchain.mempool),
         'difficulty': blockchain.difficulty
-    }), 200
+    })
+    body = data[:-1] + b',"chain":' + chain_bytes + b'}'
+    return Response(body, status=200, mimetype='application/json')
+
+@app.route('/events', methods=['GET'])
+def events():
+    q = blockchain.subscribe()
+    if q is None:
+        return jsonify({'error': 'Trop de clients connectés aux événements'}), 503
+    
+    def stream():
+        while True:
+            try:
+                yield f'data: {q.get(timeout=1)}\n\n'
+            except queue.Empty:
+                # Envoyé chaque seconde : garde la connexion ouverte derrière les proxys et
+                # fait échouer rapidement l'écriture vers un client parti, libérant sa place
+                yield ': keep-alive\n\n'
+    
+    response = Response(stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Libère la place à la fermeture, même si le flux n'a jamais démarré
+    response.call_on_close(lambda: blockchain.unsubscribe(q))
+    return response
 
 @app.route('/validate', methods=['GET'])
 def validate_chain():
@@ -750,7 +1024,11 @@ def get_balance(address):
         'balance': balance
     }), 200
 
-# Pour l'exécution locale
+# Pour l'exécution locale : même serveur qu'en production (gunicorn, voir gunicorn_conf.py),
+# lancé avec l'interpréteur courant et indépendamment du répertoire de travail
 if __name__ == "__main__":
-    port = int(os.environ.get("PORT", 5000))
-    app.run(host='0.0.0.0', port=port, debug=False)
+    here = os.path.dirname(os.path.abspath(__file__))
+    os.execv(sys.executable, [sys.executable, '-m', 'gunicorn',
+                              '-c', os.path.join(here, 'gunicorn_conf.py'),
+                              '--chdir', here,
+                              'blockchain_network_render:app'])
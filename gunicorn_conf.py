@@ -0,0 +1,10 @@
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+# Un seul processus : la blockchain est gardée en mémoire, plusieurs workers
+# auraient chacun leur propre chaîne. Les threads servent les requêtes en parallèle ;
+# chaque client connecté à /events en occupe un, d'où le plafond MAX_EVENT_CLIENTS
+# (8 par défaut), à garder bien en dessous de cette valeur.
+workers = 1
+worker_class = "gthread"
+threads = 16